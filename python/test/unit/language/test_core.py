@@ -1,4 +1,5 @@
 # flake8: noqa: F821,F841
+import functools
 import itertools
 import os
 import re
@@ -21,10 +22,18 @@ dtypes = int_dtypes + uint_dtypes + float_dtypes
 dtypes_with_bfloat16 = dtypes + ['bfloat16']
 torch_dtypes = ['bool'] + int_dtypes + ['uint8'] + float_dtypes + ['bfloat16']
 
+# queried once: the capability can't change during a session and the tests
+# below consult it for thousands of parametrized cases
+_capability = torch.cuda.get_device_capability() if torch.cuda.is_available() else (0, 0)
+_bfloat16_dtypes = frozenset([tl.bfloat16, 'bfloat16', torch.bfloat16])
+
+
+# ex.: "int64" -> 64
+_bitwidths = {dtype: int(re.search(r'(\d+)$', dtype).group(1)) for dtype in dtypes_with_bfloat16}
+
 
 def _bitwidth(dtype: str) -> int:
-    # ex.: "int64" -> 64
-    return int(re.search(r'(\d+)$', dtype).group(1))
+    return _bitwidths[dtype]
 
 
 def numpy_random(shape, dtype_str, rs: Optional[RandomState] = None, low=None, high=None):
@@ -41,35 +50,117 @@ def numpy_random(shape, dtype_str, rs: Optional[RandomState] = None, low=None, h
         low = iinfo.min if low is None else max(low, iinfo.min)
         high = iinfo.max if high is None else min(high, iinfo.max)
         dtype = getattr(np, dtype_str)
-        x = rs.randint(low, high, shape, dtype=dtype)
-        x[x == 0] = 1  # Hack. Never return zero so tests of division don't error out.
+        # Hack. Never return zero so tests of division don't error out.
+        if low <= 0 < high - 1:
+            # draw from [low, high - 1) and shift the non-negative half up by
+            # one, which skips zero in a single pass over the buffer
+            x = rs.randint(low, high - 1, shape, dtype=dtype)
+            x += (x >= 0).astype(dtype)
+        else:
+            x = rs.randint(low, high, shape, dtype=dtype)
+            x[x == 0] = 1
         return x
     elif dtype_str in float_dtypes:
         return rs.normal(0, 1, shape).astype(dtype_str)
     elif dtype_str == 'bfloat16':
-        return (rs.normal(0, 1, shape).astype('float32').view('uint32')
-                & np.uint32(0xffff0000)).view('float32')
+        # truncate the mantissa in place; astype() already returned a fresh buffer
+        x = rs.normal(0, 1, shape).astype('float32')
+        x.view('uint32')[...] &= np.uint32(0xffff0000)
+        return x
     elif dtype_str in ['bool', 'int1', 'bool_']:
         return rs.normal(0, 1, shape) > 0.0
     else:
         raise RuntimeError(f'Unknown dtype {dtype_str}')
 
 
-def to_triton(x: np.ndarray, device='cuda', dst_type=None) -> Union[TensorWrapper, torch.Tensor]:
+def numpy_random_pair(shape, dtype_x, dtype_y, rs: Optional[RandomState] = None, y_low=None, y_high=None):
+    """
+    Returns `(numpy_random(shape, dtype_x, rs), numpy_random(shape, dtype_y, rs, y_low, y_high))`.
+    When both draws come from the same distribution they are made with a
+    single call into `rs`, and `x` and `y` are two halves of the same buffer.
+    """
+    if dtype_x != dtype_y or y_low is not None or y_high is not None:
+        x = numpy_random(shape, dtype_str=dtype_x, rs=rs)
+        y = numpy_random(shape, dtype_str=dtype_y, rs=rs, low=y_low, high=y_high)
+        return x, y
+    if isinstance(shape, int):
+        shape = (shape, )
+    x, y = numpy_random((2, ) + tuple(shape), dtype_str=dtype_x, rs=rs)
+    return x, y
+
+
+# pinned host buffers used to stage the inputs of the generic elementwise
+# tests, keyed by (shape, dtype, device)
+_staging_buffers = {}
+
+
+def _to_device(x: np.ndarray, device, staged: bool) -> torch.Tensor:
+    '''
+    Copy `x` to a fresh tensor on `device`. If `staged`, CUDA uploads go
+    through a pinned staging buffer that is reused across calls with the same
+    shape and dtype, so the copy is a single asynchronous DMA instead of a
+    pageable copy.
+    '''
+    if not staged or torch.device(device).type != 'cuda':
+        return torch.tensor(x, device=device)
+    key = (x.shape, x.dtype, device)
+    if key in _staging_buffers:
+        host, uploaded = _staging_buffers[key]
+        # the previous upload out of this buffer must be done before we overwrite it
+        uploaded.synchronize()
+    else:
+        host = torch.from_numpy(np.empty(x.shape, dtype=x.dtype)).pin_memory()
+        uploaded = torch.cuda.Event()
+    host.numpy()[...] = x
+    dev = torch.empty_like(host, device=device)
+    dev.copy_(host, non_blocking=True)
+    # the copy runs on the current stream of the destination device
+    uploaded.record(torch.cuda.current_stream(dev.device))
+    _staging_buffers[key] = (host, uploaded)
+    return dev
+
+
+def to_triton(x: np.ndarray, device='cuda', dst_type=None, staged=False) -> Union[TensorWrapper, torch.Tensor]:
     '''
     Note: We need dst_type because the type of x can be different from dst_type.
           For example: x is of type `float32`, dst_type is `bfloat16`.
           If dst_type is None, we infer dst_type from x.
+    `staged` uploads `x` through a pinned buffer kept for the rest of the
+    session; it is meant for the small inputs of the generic elementwise
+    tests, which come in a handful of shapes.
     '''
     t = x.dtype.name
     if t in uint_dtypes:
         signed_type_name = t.lstrip('u')  # e.g. "uint16" -> "int16"
-        x_signed = x.astype(getattr(np, signed_type_name))
-        return reinterpret(torch.tensor(x_signed, device=device), getattr(tl, t))
+        # same bits, so a view avoids copying x on the host
+        x_signed = x.view(getattr(np, signed_type_name))
+        return reinterpret(_to_device(x_signed, device, staged), getattr(tl, t))
     else:
         if t == 'float32' and dst_type == 'bfloat16':
-            return torch.tensor(x, device=device).bfloat16()
-        return torch.tensor(x, device=device)
+            return _to_device(x, device, staged).bfloat16()
+        return _to_device(x, device, staged)
+
+
+# output buffers shared across the generic tests, see `empty_output`
+_output_buffers = {}
+
+
+def empty_output(shape, dtype, device='cuda', dst_type=None) -> Union[TensorWrapper, torch.Tensor]:
+    '''
+    Same as `to_triton(np.empty(shape, dtype=dtype), device, dst_type)`, except
+    that the tensor is allocated once per (shape, dtype, device, dst_type) and
+    handed out again on later calls. It must only be used as a kernel output
+    that is fully overwritten and read back before the next test runs.
+    '''
+    if isinstance(shape, int):
+        shape = (shape, )
+    key = (tuple(shape), np.dtype(dtype), device, dst_type)
+    if key not in _output_buffers:
+        _output_buffers[key] = to_triton(np.empty(shape, dtype=dtype), device=device, dst_type=dst_type)
+    return _output_buffers[key]
+
+
+_torch_dtype_re = re.compile(r'^torch\.(\w+)$')
 
 
 def torch_dtype_name(dtype) -> str:
@@ -77,19 +168,33 @@ def torch_dtype_name(dtype) -> str:
         return dtype.name
     elif isinstance(dtype, torch.dtype):
         # 'torch.int64' -> 'int64'
-        m = re.match(r'^torch\.(\w+)$', str(dtype))
+        m = _torch_dtype_re.match(str(dtype))
         return m.group(1)
     else:
         raise TypeError(f'not a triton or torch dtype: {type(dtype)}')
 
 
+def _to_host(x: torch.Tensor) -> torch.Tensor:
+    '''
+    Copy `x` to the host. CUDA tensors are read back into pinned memory, taken
+    from torch's caching host allocator, so the copy is a direct DMA rather
+    than a copy through a pageable staging buffer.
+    '''
+    if not x.is_cuda:
+        return x
+    host = torch.empty(x.shape, dtype=x.dtype, pin_memory=True)
+    host.copy_(x)
+    return host
+
+
 def to_numpy(x):
     if isinstance(x, TensorWrapper):
-        return x.base.cpu().numpy().astype(getattr(np, torch_dtype_name(x.dtype)))
+        # the base tensor already holds the right bits; reinterpret them in place
+        return to_numpy(x.base).view(getattr(np, torch_dtype_name(x.dtype)))
     elif isinstance(x, torch.Tensor):
         if x.dtype is torch.bfloat16:
-            return x.cpu().float().numpy()
-        return x.cpu().numpy()
+            x = x.float()
+        return _to_host(x).numpy()
     else:
         raise ValueError(f"Not a triton-compatible tensor: {x}")
 
@@ -105,12 +210,47 @@ def check_type_supported(dtype):
     '''
     skip test if dtype is not supported on the current device
     '''
-    cc = torch.cuda.get_device_capability()
-    if cc[0] < 8 and (dtype is tl.bfloat16 or dtype == "bfloat16" or dtype is torch.bfloat16):
+    if _capability[0] < 8 and dtype in _bfloat16_dtypes:
         pytest.skip("bfloat16 is only supported on NVGPU with cc >= 80")
 
 
-@pytest.mark.parametrize("dtype_x", list(dtypes) + ["bfloat16"])
+_bfloat16_skip = pytest.mark.skipif(_capability[0] < 8, reason="bfloat16 is only supported on NVGPU with cc >= 80")
+
+
+def skip_unsupported(params):
+    '''
+    Marks the cases of a parametrize list that use bfloat16 as skipped when the
+    current device does not support it, so that pytest skips them at
+    collection time instead of setting them up and calling
+    `check_type_supported` in the test body.
+    '''
+    def mark(case):
+        values = case if isinstance(case, tuple) else (case, )
+        if any(v in _bfloat16_dtypes for v in values):
+            return pytest.param(*values, marks=_bfloat16_skip)
+        return case
+    return [mark(case) for case in params]
+
+
+@pytest.mark.parametrize("dtype_str", int_dtypes + uint_dtypes)
+def test_numpy_random_nonzero(dtype_str):
+    x = numpy_random(4096, dtype_str=dtype_str)
+    assert x.dtype == getattr(np, dtype_str)
+    assert (x != 0).all()
+    assert (x > 0).any()
+    if dtype_str in int_dtypes:
+        assert (x < 0).any()
+
+
+@pytest.mark.parametrize("dtype_str", uint_dtypes)
+def test_to_numpy_uint_roundtrip(dtype_str, device='cuda'):
+    x = numpy_random(128, dtype_str=dtype_str)
+    y = to_numpy(to_triton(x, device=device))
+    assert y.dtype == x.dtype
+    assert y.tobytes() == x.tobytes()
+
+
+@pytest.mark.parametrize("dtype_x", skip_unsupported(list(dtypes) + ["bfloat16"]))
 def test_empty_kernel(dtype_x, device='cuda'):
     SIZE = 128
 
@@ -123,19 +263,89 @@ def test_empty_kernel(dtype_x, device='cuda'):
 
 
 # generic test functions
+@triton.jit
+def _UNARY_KERNEL_TEMPLATE(Z, X, SIZE: tl.constexpr):
+    off = tl.arange(0, SIZE)
+    x = tl.load(X + off)
+    z = GENERATE_TEST_HERE
+    tl.store(Z + off, z)
+
+
+# The generic tests are parametrized over thousands of (dtype, expr)
+# combinations that share a handful of expressions. Patching the template
+# once per expression lets all of them share a single JITFunction (and
+# therefore its compilation cache) instead of re-building one per test.
+@functools.lru_cache(maxsize=None)
+def _patched_unary(expr):
+    return patch_kernel(_UNARY_KERNEL_TEMPLATE, {'GENERATE_TEST_HERE': expr})
+
+
+# Binary operators `x <op> y` are dispatched on a constexpr opcode rather than
+# patched into the source: every operator then shares one JITFunction, with
+# one compiled binary per (dtypes, opcode), and no source is re-parsed.
+_binary_ops = ['+', '-', '*', '/', '%', '//', '&', '|', '^', '<<', '>>', '==', '!=', '>', '<', '>=', '<=']
+_binary_op_codes = {op: i for i, op in enumerate(_binary_ops)}
+
+
+@triton.jit
+def _binary_op_kernel(Z, X, Y, SIZE: tl.constexpr, OP: tl.constexpr):
+    # each program checks its own SIZE-element case, see `_test_binary_batched`
+    off = tl.program_id(0) * SIZE + tl.arange(0, SIZE)
+    x = tl.load(X + off)
+    y = tl.load(Y + off)
+    if OP == 0:
+        z = x + y
+    elif OP == 1:
+        z = x - y
+    elif OP == 2:
+        z = x * y
+    elif OP == 3:
+        z = x / y
+    elif OP == 4:
+        z = x % y
+    elif OP == 5:
+        z = x // y
+    elif OP == 6:
+        z = x & y
+    elif OP == 7:
+        z = x | y
+    elif OP == 8:
+        z = x ^ y
+    elif OP == 9:
+        z = x << y
+    elif OP == 10:
+        z = x >> y
+    elif OP == 11:
+        z = x == y
+    elif OP == 12:
+        z = x != y
+    elif OP == 13:
+        z = x > y
+    elif OP == 14:
+        z = x < y
+    elif OP == 15:
+        z = x >= y
+    elif OP == 16:
+        z = x <= y
+    tl.store(Z + off, z)
+
+
+def _binary_op_code(expr: str) -> Optional[int]:
+    """
+    Returns the opcode of `_binary_op_kernel` computing `expr`, or None if
+    `expr` is not of the form `x <op> y`.
+    """
+    tokens = expr.split()
+    if len(tokens) == 3 and tokens[0] == 'x' and tokens[2] == 'y':
+        return _binary_op_codes.get(tokens[1])
+    return None
+
+
 def _test_unary(dtype_x, expr, numpy_expr=None, device='cuda'):
     check_type_supported(dtype_x)  # early return if dtype_x is not supported
     SIZE = 128
     # define the kernel / launch-grid
-
-    @triton.jit
-    def kernel(Z, X, SIZE: tl.constexpr):
-        off = tl.arange(0, SIZE)
-        x = tl.load(X + off)
-        z = GENERATE_TEST_HERE
-        tl.store(Z + off, z)
-
-    kernel = patch_kernel(kernel, {'GENERATE_TEST_HERE': expr})
+    kernel = _patched_unary(expr)
     # inputs
     x = numpy_random(SIZE, dtype_str=dtype_x)
     if 'log' in expr:
@@ -143,13 +353,35 @@ def _test_unary(dtype_x, expr, numpy_expr=None, device='cuda'):
     # reference result
     z_ref = eval(expr if numpy_expr is None else numpy_expr)
     # triton result
-    x_tri = to_triton(x, device=device, dst_type=dtype_x)
-    z_tri = to_triton(np.empty_like(z_ref), device=device, dst_type=dtype_x)
+    x_tri = to_triton(x, device=device, dst_type=dtype_x, staged=True)
+    z_tri = empty_output(z_ref.shape, z_ref.dtype, device=device, dst_type=dtype_x)
     kernel[(1, )](z_tri, x_tri, SIZE=SIZE, num_warps=4)
     # compare
     np.testing.assert_allclose(z_ref, to_numpy(z_tri), rtol=0.01)
 
 
+_binary_op_dtype_overrides = {
+    ('float16', 'int16'): np.float16,
+    ('float16', 'int32'): np.float16,
+    ('float16', 'int64'): np.float16,
+    ('float16', 'uint16'): np.float16,
+    ('float16', 'uint32'): np.float16,
+    ('float16', 'uint64'): np.float16,
+    ('int8', 'uint8'): np.uint8,
+    ('int8', 'uint16'): np.uint16,
+    ('int8', 'uint32'): np.uint32,
+    ('int8', 'uint64'): np.uint64,
+    ('int16', 'uint16'): np.uint16,
+    ('int16', 'uint32'): np.uint32,
+    ('int16', 'uint64'): np.uint64,
+    ('int32', 'uint32'): np.uint32,
+    ('int32', 'uint64'): np.uint64,
+    ('int64', 'uint64'): np.uint64,
+}
+# the overrides are symmetric; list both operand orders so lookups need no sorting
+_binary_op_dtype_overrides.update({(b, a): dtype for (a, b), dtype in list(_binary_op_dtype_overrides.items())})
+
+
 def _binary_op_dtype_override(a: str, b: str) -> Optional[np.dtype]:
     """
     Given two dtype strings, returns the numpy dtype Triton thinks binary
@@ -159,62 +391,80 @@ def _binary_op_dtype_override(a: str, b: str) -> Optional[np.dtype]:
     Triton follows C/C++ semantics around mixed signed/unsigned operations, and
     numpy/pytorch do not.
     """
-    overrides = {
-        ('float16', 'int16'): np.float16,
-        ('float16', 'int32'): np.float16,
-        ('float16', 'int64'): np.float16,
-        ('float16', 'uint16'): np.float16,
-        ('float16', 'uint32'): np.float16,
-        ('float16', 'uint64'): np.float16,
-        ('int8', 'uint8'): np.uint8,
-        ('int8', 'uint16'): np.uint16,
-        ('int8', 'uint32'): np.uint32,
-        ('int8', 'uint64'): np.uint64,
-        ('int16', 'uint16'): np.uint16,
-        ('int16', 'uint32'): np.uint32,
-        ('int16', 'uint64'): np.uint64,
-        ('int32', 'uint32'): np.uint32,
-        ('int32', 'uint64'): np.uint64,
-        ('int64', 'uint64'): np.uint64,
-    }
-    key = (a, b) if a < b else (b, a)
-    return overrides.get(key)
+    return _binary_op_dtype_overrides.get((a, b))
+
+
+# numpy reference expressions of the form `x.astype(np.T) <op> y.astype(np.T)`
+_cast_binary_expr_re = re.compile(r'^x\.astype\(np\.(\w+)\) (\S+) y\.astype\(np\.\1\)$')
+_numpy_binary_ufuncs = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.true_divide,
+    '%': np.remainder,
+    '&': np.bitwise_and,
+    '|': np.bitwise_or,
+    '^': np.bitwise_xor,
+    '<<': np.left_shift,
+    '>>': np.right_shift,
+}
+
+
+def _eval_binary_reference(expr, x, y):
+    """
+    Evaluates the numpy expression `expr` of `x` and `y`. Casting expressions
+    such as `x.astype(np.uint64) + y.astype(np.uint64)` are computed with a
+    single ufunc call that casts its operands on the fly, instead of
+    materializing both casts first.
+    """
+    m = _cast_binary_expr_re.match(expr)
+    if m is not None and m.group(2) in _numpy_binary_ufuncs:
+        dtype = np.dtype(getattr(np, m.group(1)))
+        # numpy's integer true division returns floats, leave it to eval
+        if m.group(2) != '/' or dtype.kind == 'f':
+            return _numpy_binary_ufuncs[m.group(2)](x, y, dtype=dtype, casting='unsafe')
+    return eval(expr)
 
 
-def _test_binary(dtype_x, dtype_y, expr, numpy_expr=None, mode_x='real', mode_y='real', device='cuda', y_low=None, y_high=None):
+def _test_binary(dtype_x, dtype_y, expr, numpy_expr=None, device='cuda', y_low=None, y_high=None):
+    _test_binary_batched(dtype_x, dtype_y, expr, [('real', 'real')], numpy_expr, device=device, y_low=y_low, y_high=y_high)
+
+
+def _test_binary_batched(dtype_x, dtype_y, expr, modes, numpy_expr=None, device='cuda', y_low=None, y_high=None):
+    """
+    Checks `expr`, which must be of the form `x <op> y`, on one SIZE-element
+    case per (mode_x, mode_y) pair of `modes`, with a single launch of
+    `_binary_op_kernel`. The kernel is specialized on the dtypes, so only
+    cases sharing `dtype_x`, `dtype_y` and `expr` can be batched.
+    """
     check_type_supported(dtype_x)  # early return if dtype_x is not supported
     check_type_supported(dtype_y)
     SIZE = 128
     # define the kernel / launch-grid
-
-    @triton.jit
-    def kernel(Z, X, Y, SIZE: tl.constexpr):
-        off = tl.arange(0, SIZE)
-        x = tl.load(X + off)
-        y = tl.load(Y + off)
-        z = GENERATE_TEST_HERE
-        tl.store(Z + off, z)
-
-    kernel = patch_kernel(kernel, {'GENERATE_TEST_HERE': expr})
-    # inputs
+    op_code = _binary_op_code(expr)
+    assert op_code is not None, f'not a binary operator expression: {expr!r}'
+    grid = (len(modes), )
+    # inputs: one row per case
     rs = RandomState(17)
-    x = numpy_random(SIZE, dtype_str=dtype_x, rs=rs)
-    y = numpy_random(SIZE, dtype_str=dtype_y, rs=rs, low=y_low, high=y_high)
-    if mode_x == 'nan':
-        x[:] = float('nan')
-    if mode_y == 'nan':
-        y[:] = float('nan')
+    x, y = numpy_random_pair((len(modes), SIZE), dtype_x, dtype_y, rs=rs, y_low=y_low, y_high=y_high)
+    for i, (mode_x, mode_y) in enumerate(modes):
+        if mode_x == 'nan':
+            x[i] = float('nan')
+        if mode_y == 'nan':
+            y[i] = float('nan')
     # reference result
-    z_ref = eval(expr if numpy_expr is None else numpy_expr)
+    z_ref = _eval_binary_reference(expr if numpy_expr is None else numpy_expr, x, y)
     dtype_z = _binary_op_dtype_override(dtype_x, dtype_y)
     if dtype_z is not None:
         z_ref = z_ref.astype(dtype_z)
     # triton result
-    x_tri = to_triton(x, device=device, dst_type=dtype_x)
-    y_tri = to_triton(y, device=device, dst_type=dtype_y)
-    z_tri = to_triton(np.empty(SIZE, dtype=z_ref.dtype), device=device)
-    kernel[(1, )](z_tri, x_tri, y_tri, SIZE=SIZE, num_warps=4)
-    np.testing.assert_allclose(z_ref, to_numpy(z_tri), err_msg=expr, rtol=0.01)
+    x_tri = to_triton(x, device=device, dst_type=dtype_x, staged=True)
+    y_tri = to_triton(y, device=device, dst_type=dtype_y, staged=True)
+    z_tri = empty_output(z_ref.shape, z_ref.dtype, device=device)
+    _binary_op_kernel[grid](z_tri, x_tri, y_tri, SIZE=SIZE, OP=op_code, num_warps=4)
+    z_out = to_numpy(z_tri)
+    for i, mode in enumerate(modes):
+        np.testing.assert_allclose(z_ref[i], z_out[i], err_msg=f'{expr} {mode}', rtol=0.01)
 
 
 def _mod_operation_ill_conditioned(dtype_x, dtype_y) -> bool:
@@ -247,12 +497,21 @@ def _mod_operation_ill_conditioned(dtype_x, dtype_y) -> bool:
 # ---------------
 
 
-@pytest.mark.parametrize("dtype_x, dtype_y, op", [
+# operators whose result doesn't depend on the operand order: for those, the
+# (dtype_y, dtype_x) case checks the same promotion rules as (dtype_x, dtype_y)
+_commutative_ops = {'+', '*', '&', '|', '^', '==', '!='}
+
+
+def _is_mirrored_case(dtype_x, dtype_y, op) -> bool:
+    return op in _commutative_ops and dtype_x > dtype_y
+
+
+@pytest.mark.parametrize("dtype_x, dtype_y, op", skip_unsupported([
     (dtype_x, dtype_y, op)
     for op in ['+', '-', '*', '/', '%']
-    for dtype_x in dtypes_with_bfloat16
-    for dtype_y in dtypes_with_bfloat16
-])
+    for dtype_x, dtype_y in itertools.product(dtypes_with_bfloat16, repeat=2)
+    if not _is_mirrored_case(dtype_x, dtype_y, op)
+]))
 def test_bin_op(dtype_x, dtype_y, op, device='cuda'):
     expr = f' x {op} y'
     if op == '%' and dtype_x in int_dtypes + uint_dtypes and dtype_y in int_dtypes + uint_dtypes:
@@ -298,12 +557,12 @@ def test_floordiv(dtype_x, dtype_y, device='cuda'):
 # ---------------
 # test bitwise ops
 # ---------------
-@pytest.mark.parametrize("dtype_x, dtype_y, op", [
+@pytest.mark.parametrize("dtype_x, dtype_y, op", skip_unsupported([
     (dtype_x, dtype_y, op)
     for op in ['&', '|', '^']
-    for dtype_x in dtypes + dtypes_with_bfloat16
-    for dtype_y in dtypes + dtypes_with_bfloat16
-])
+    for dtype_x, dtype_y in itertools.product(dtypes_with_bfloat16, repeat=2)
+    if not _is_mirrored_case(dtype_x, dtype_y, op)
+]))
 def test_bitwise_op(dtype_x, dtype_y, op, device='cuda'):
     expr = f'x {op} y'
     if (dtype_x in uint_dtypes and dtype_y in int_dtypes and _bitwidth(dtype_x) >= _bitwidth(dtype_y)):
@@ -344,23 +603,13 @@ def test_shift_op(dtype_x, dtype_y, op, device='cuda'):
 ops = ['==', '!=', '>', '<', '>=', '<=']
 
 
-@pytest.mark.parametrize("dtype_x, dtype_y, op, mode_x, mode_y",
-                         # real
-                         [
-                             (dtype_x, dtype_y, op, 'real', 'real')
-                             for op in ops
-                             for dtype_x in dtypes
-                             for dtype_y in dtypes
-                         ] +
-                         # NaNs
-                         [('float32', 'float32', op, mode_x, mode_y)
-                             for op in ops
-                             for mode_x, mode_y in [('nan', 'real'),
-                                                    ('real', 'nan'),
-                                                    ('nan', 'nan')]
-
-                          ])
-def test_compare_op(dtype_x, dtype_y, op, mode_x, mode_y, device='cuda'):
+@pytest.mark.parametrize("dtype_x, dtype_y, op", [
+    (dtype_x, dtype_y, op)
+    for op in ops
+    for dtype_x, dtype_y in itertools.product(dtypes, repeat=2)
+    if not _is_mirrored_case(dtype_x, dtype_y, op)
+])
+def test_compare_op(dtype_x, dtype_y, op, device='cuda'):
     expr = f'x {op} y'
     if (dtype_x in uint_dtypes and dtype_y in int_dtypes and _bitwidth(dtype_x) >= _bitwidth(dtype_y)):
         numpy_expr = f'x.astype(np.{dtype_x}) {op} y.astype(np.{dtype_x})'
@@ -368,13 +617,21 @@ def test_compare_op(dtype_x, dtype_y, op, mode_x, mode_y, device='cuda'):
         numpy_expr = f'x.astype(np.{dtype_y}) {op} y.astype(np.{dtype_y})'
     else:
         numpy_expr = None
-    _test_binary(dtype_x, dtype_y, expr, numpy_expr, mode_x=mode_x, mode_y=mode_y, device=device)
+    _test_binary(dtype_x, dtype_y, expr, numpy_expr, device=device)
+
+
+@pytest.mark.parametrize("op", ops)
+def test_compare_op_nan(op, device='cuda'):
+    # all NaN cases share a kernel, so they are checked with a single launch
+    expr = f'x {op} y'
+    modes = [('nan', 'real'), ('real', 'nan'), ('nan', 'nan')]
+    _test_binary_batched('float32', 'float32', expr, modes, device=device)
 
 
 # ---------------
 # test where
 # ---------------
-@pytest.mark.parametrize("dtype", dtypes_with_bfloat16 + ["*int32"])
+@pytest.mark.parametrize("dtype", skip_unsupported(dtypes_with_bfloat16 + ["*int32"]))
 def test_where(dtype):
     select_ptrs = False
     if dtype == "*int32":
@@ -455,11 +712,11 @@ def test_where_broadcast():
 # ---------------
 
 
-@pytest.mark.parametrize("dtype_x, expr", [
+@pytest.mark.parametrize("dtype_x, expr", skip_unsupported([
     (dtype_x, ' -x') for dtype_x in dtypes_with_bfloat16
 ] + [
     (dtype_x, ' ~x') for dtype_x in int_dtypes
-])
+]))
 def test_unary_op(dtype_x, expr, device='cuda'):
     _test_unary(dtype_x, expr, device=device)
 
@@ -609,7 +866,7 @@ def test_tuples():
     ]
     for mode in ['all_neg', 'all_pos', 'min_neg', 'max_pos']]))
 def test_atomic_rmw(op, dtype_x_str, mode, device='cuda'):
-    capability = torch.cuda.get_device_capability()
+    capability = _capability
     if capability[0] < 7:
         if dtype_x_str == 'float16':
             pytest.skip("Only test atomic float16 ops on devices with sm >= 70")
@@ -1103,7 +1360,7 @@ def test_permute(dtype_str, shape, perm, device='cuda'):
                           for col_b in [True, False]
                           for dtype in ['int8', 'float16', 'float32']])
 def test_dot(M, N, K, num_warps, col_a, col_b, epilogue, allow_tf32, dtype, device='cuda'):
-    capability = torch.cuda.get_device_capability()
+    capability = _capability
     if capability[0] < 7:
         pytest.skip("Only test tl.dot() on devices with sm >= 70")
     if capability[0] < 8:
@@ -1674,9 +1931,10 @@ def test_libdevice_tensor(dtype_str, expr, lib_path):
         y_ref = np.log2(5.0)
     elif expr == 'libdevice.ffs':
         kernel = patch_kernel(kernel, {'GENERATE_TEST_HERE': 'tl.libdevice.ffs(x)'})
-        y_ref = np.zeros(shape, dtype=x.dtype)
-        for i in range(shape[0]):
-            y_ref[i] = (int(x[i]) & int(-x[i])).bit_length()
+        # ffs(x) is one plus the index of the lowest set bit, or 0 if x == 0
+        x_wide = x.astype(np.int64)
+        lowest_bit = x_wide & -x_wide
+        y_ref = np.where(lowest_bit == 0, 0, np.log2(np.maximum(lowest_bit, 1)).astype(np.int64) + 1).astype(x.dtype)
     elif expr == 'libdevice.pow':
         # numpy does not allow negative factors in power, so we use abs()
         x = np.abs(x)
@@ -1688,7 +1946,7 @@ def test_libdevice_tensor(dtype_str, expr, lib_path):
 
     x_tri = to_triton(x)
     # triton result
-    y_tri = to_triton(numpy_random((shape[0],), dtype_str=dtype_str, rs=rs), device='cuda')
+    y_tri = empty_output(shape, dtype_str, device='cuda')
     kernel[(1,)](x_tri, y_tri, BLOCK=shape[0], extern_libs={'libdevice': lib_path})
     # compare
     if expr == 'libdevice.ffs':
@@ -1720,7 +1978,7 @@ def test_libdevice_scalar(dtype_str, expr, lib_path):
 
     # triton result
     x_tri = to_triton(x)[0].item()
-    y_tri = to_triton(numpy_random((shape[0],), dtype_str=dtype_str, rs=rs), device='cuda')
+    y_tri = empty_output(shape, dtype_str, device='cuda')
     kernel[(1,)](x_tri, y_tri, BLOCK=shape[0], extern_libs={'libdevice': lib_path})
     # compare
     np.testing.assert_allclose(y_ref, to_numpy(y_tri), rtol=0.01)